@@ -8,12 +8,14 @@ import time
 from io import BytesIO
 import os
 import math
+import threading
 from sss_core import split_secret, recover_secret
 from image_utils import (
     image_to_shares, 
     shares_to_image, 
-    create_preview_image, 
-    download_button
+    create_preview_image,
+    precompute_share_masks,
+    secret_shape
 )
 
 # Set page configuration
@@ -47,6 +49,18 @@ st.markdown("""
     .stButton button:hover {
         background-color: #ef233c;
     }
+    .stDownloadButton button {
+        background-color: #d90429;
+        color: white;
+        border-radius: 5px;
+        border: none;
+        padding: 0.5rem 1rem;
+        transition: background-color 0.3s;
+    }
+    .stDownloadButton button:hover {
+        background-color: #ef233c;
+        color: white;
+    }
     .info-box {
         background-color: #8d99ae;
         color: white;
@@ -104,8 +118,66 @@ if 'selected_shares' not in st.session_state:
     st.session_state.selected_shares = []
 if 'uploaded_share_data' not in st.session_state:
     st.session_state.uploaded_share_data = []
+if 'upload_hashes' not in st.session_state:
+    st.session_state.upload_hashes = ()
+if 'uploaded_share_keys' not in st.session_state:
+    st.session_state.uploaded_share_keys = []
+if 'upload_errors' not in st.session_state:
+    st.session_state.upload_errors = []
 if 'threshold' not in st.session_state:
     st.session_state.threshold = 2
+if 'share_mask_job' not in st.session_state:
+    st.session_state.share_mask_job = None
+if 'encrypted_mask_key' not in st.session_state:
+    st.session_state.encrypted_mask_key = None
+
+# Images with more pixels get a warning, and no background mask job
+LARGE_IMAGE_PIXELS = 500000  # Roughly a 700x700 image
+
+# Cache the expensive split/combine work so Streamlit reruns with the same
+# inputs reuse the previous result instead of recomputing it. Streamlit replays
+# the element calls made inside a cached function on every cache hit, so these
+# must not update widgets (like a progress bar) created outside of them
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def cached_image_to_shares(image_bytes, num_shares, threshold, _share_masks=None):
+    """
+    Split the encoded image bytes into shares, cached on (image bytes, k, t)
+    """
+    image = Image.open(BytesIO(image_bytes))
+    return image_to_shares(image, num_shares, threshold, share_masks=_share_masks)
+
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def cached_shares_to_image(share_keys, _share_arrays):
+    """
+    Combine shares given as a tuple of (index, pixel array), cached on share_keys,
+    the (index, file content hash) of every share
+    """
+    # Streamlit only hashes a random sample of large arrays, so the arrays
+    # themselves are left out of the cache key
+    return shares_to_image(list(_share_arrays))
+
+def start_share_mask_job(key, shape, num_shares, threshold):
+    """
+    Compute the secret-independent share masks in a background thread, so that
+    the work overlaps with the user choosing parameters instead of the Encrypt click
+    """
+    job = {'key': key, 'masks': None, 'cancel': threading.Event()}
+    
+    def run():
+        job['masks'] = precompute_share_masks(shape, num_shares, threshold, cancel_event=job['cancel'])
+    
+    job['thread'] = threading.Thread(target=run, daemon=True)
+    job['thread'].start()
+    return job
+
+def cancel_share_mask_job():
+    """
+    Stop the session's background mask job, if any, and drop its masks
+    """
+    job = st.session_state.share_mask_job
+    if job is not None:
+        job['cancel'].set()
+        st.session_state.share_mask_job = None
 
 # Header
 st.title("🔐 Shamir's Secret Sharing Image Tool")
@@ -132,7 +204,7 @@ with tab1:
             st.session_state.original_image = image
             
             # Show a warning for large images
-            if image.width * image.height > 500000:  # Roughly a 700x700 image
+            if image.width * image.height > LARGE_IMAGE_PIXELS:
                 st.markdown("""
                 <div class="error-box">
                 You have uploaded a large image! Processing may take a while. Consider using a smaller image for faster results.
@@ -155,16 +227,42 @@ with tab1:
                 </div>
                 """, unsafe_allow_html=True)
             else:
+                # Start precomputing the share masks for the current image and (k, t).
+                # Stop the job for previous inputs first, so that at most one mask
+                # computation runs (and holds its masks) per session
+                image_shape = secret_shape(image)
+                mask_key = (hash(uploaded_file.getvalue()), image_shape, k, t)
+                job = st.session_state.share_mask_job
+                if job is not None and job['key'] != mask_key:
+                    cancel_share_mask_job()
+                    job = None
+                
+                # Masks of large images would hold hundreds of MB per idle session,
+                # and inputs that were already encrypted are served from the cache
+                if (job is None and image.width * image.height <= LARGE_IMAGE_PIXELS
+                        and mask_key != st.session_state.encrypted_mask_key):
+                    job = start_share_mask_job(mask_key, image_shape, k, t)
+                    st.session_state.share_mask_job = job
+                
                 # Process button
                 if st.button("Encrypt and Create Shares"):
                     with st.spinner("Processing image and generating shares..."):
                         progress_bar = st.progress(0)
                         
+                        # Masks are only ever used for one image, image_to_shares
+                        # computes them itself when there are none
+                        share_masks = None
+                        if job is not None:
+                            job['thread'].join()
+                            share_masks = job['masks']
+                        st.session_state.share_mask_job = None
+                        st.session_state.encrypted_mask_key = mask_key
+                        
                         # Process the image and create shares
                         try:
-                            shares, share_previews = image_to_shares(
-                                image, k, t, 
-                                progress_callback=lambda p: progress_bar.progress(p)
+                            shares, share_previews = cached_image_to_shares(
+                                uploaded_file.getvalue(), k, t, 
+                                _share_masks=share_masks
                             )
                             
                             st.session_state.shares = shares
@@ -179,6 +277,16 @@ with tab1:
                             </div>
                             """, unsafe_allow_html=True)
                             
+                            # Encode every share to PNG once, the bytes are reused for its
+                            # own download button and for the ZIP with all shares.
+                            # Share pixels are uniformly random and do not compress, so
+                            # DEFLATE is skipped (the reconstructed image keeps the default)
+                            share_pngs = []
+                            for share_img in share_previews:
+                                img_byte_arr = BytesIO()
+                                share_img.save(img_byte_arr, format='PNG', compress_level=0)
+                                share_pngs.append(img_byte_arr.getvalue())
+                            
                             # Display share previews in a grid
                             st.subheader("Generated Shares")
                             
@@ -187,40 +295,35 @@ with tab1:
                             if num_cols <= 0:
                                 num_cols = 1
                             cols = st.columns(num_cols)  # Maximum 3 columns
-                            for i, (share_img, share_data) in enumerate(zip(share_previews, shares)):
+                            for i, (share_img, share_png) in enumerate(zip(share_previews, share_pngs)):
                                 col_idx = i % len(cols)
                                 with cols[col_idx]:
                                     st.image(share_img, caption=f"Share {i+1}", use_container_width=True)
                                     
                                     # Download button for individual share
-                                    img_byte_arr = io.BytesIO()
-                                    share_img.save(img_byte_arr, format='PNG')
-                                    img_byte_arr = img_byte_arr.getvalue()
-                                    
-                                    download_btn = download_button(
-                                        img_byte_arr,
-                                        f"share_{i+1}.png",
-                                        f"Download Share {i+1} (.png)"
+                                    st.download_button(
+                                        label=f"Download Share {i+1} (.png)",
+                                        data=share_png,
+                                        file_name=f"share_{i+1}.png",
+                                        mime="image/png",
+                                        on_click="ignore"
                                     )
-                                    st.markdown(download_btn, unsafe_allow_html=True)
                             
                             # Create ZIP with all shares
                             zip_buffer = BytesIO()
                             with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-                                for i, (share_img, _) in enumerate(zip(share_previews, shares)):
-                                    img_byte_arr = BytesIO()
-                                    share_img.save(img_byte_arr, format='PNG')
-                                    img_byte_arr.seek(0)
-                                    zip_file.writestr(f"share_{i+1}.png", img_byte_arr.read())
+                                for i, share_png in enumerate(share_pngs):
+                                    zip_file.writestr(f"share_{i+1}.png", share_png)
                             
                             # Download button for ZIP file
                             st.markdown("### Download All Shares")
-                            zip_button = download_button(
-                                zip_buffer.getvalue(),
-                                "all_shares.zip",
-                                "Download All Shares (.zip)"
+                            st.download_button(
+                                label="Download All Shares (.zip)",
+                                data=zip_buffer.getvalue(),
+                                file_name="all_shares.zip",
+                                mime="application/zip",
+                                on_click="ignore"
                             )
-                            st.markdown(zip_button, unsafe_allow_html=True)
                             
                         except Exception as e:
                             st.markdown(f"""
@@ -236,6 +339,8 @@ with tab1:
             </div>
             """, unsafe_allow_html=True)
     else:
+        # Masks for a removed image are not needed anymore
+        cancel_share_mask_job()
         st.info("Please upload an image file. (JPG or PNG format)")
 
 with tab2:
@@ -257,13 +362,19 @@ with tab2:
     
     if uploaded_shares:
         try:
-            # Clear previous uploads if new ones are added
-            if len(uploaded_shares) != len(st.session_state.uploaded_share_data):
-                st.session_state.uploaded_share_data = []
+            # Only decode the shares again when the uploaded files actually changed,
+            # other reruns reuse the arrays from the session state. The share index
+            # comes from the filename, so a renamed file counts as a change too
+            upload_hashes = tuple((share_file.name, hash(share_file.getvalue())) for share_file in uploaded_shares)
             
             # Process uploaded shares
-            if not st.session_state.uploaded_share_data:
-                for share_file in uploaded_shares:
+            if upload_hashes != st.session_state.upload_hashes:
+                st.session_state.upload_hashes = upload_hashes
+                st.session_state.uploaded_share_data = []
+                st.session_state.uploaded_share_keys = []
+                st.session_state.upload_errors = []
+                
+                for share_file, (_, content_hash) in zip(uploaded_shares, upload_hashes):
                     try:
                         # Extract share index from filename: "share_X.png" or "share_X (Y).png"
                         filename = share_file.name
@@ -277,14 +388,21 @@ with tab2:
                         else:
                             idx = len(st.session_state.uploaded_share_data) + 1  # Fallback
                         
+                        # Decode the share once and keep only its pixel array, which is
+                        # what previews and the combine step both use
                         share_img = Image.open(share_file)
-                        st.session_state.uploaded_share_data.append((idx, share_img))
+                        share_img.load()
+                        st.session_state.uploaded_share_data.append((idx, np.asarray(share_img)))
+                        st.session_state.uploaded_share_keys.append((idx, content_hash))
                     except Exception as e:
-                        st.markdown(f"""
-                        <div class="error-box">
-                        Error loading share: {filename} - {str(e)}
-                        </div>
-                        """, unsafe_allow_html=True)
+                        st.session_state.upload_errors.append(f"{filename} - {str(e)}")
+            
+            for upload_error in st.session_state.upload_errors:
+                st.markdown(f"""
+                <div class="error-box">
+                Error loading share: {upload_error}
+                </div>
+                """, unsafe_allow_html=True)
             
             # Display uploaded shares
             st.subheader("Uploaded Shares")
@@ -293,10 +411,10 @@ with tab2:
                 num_cols = 1
             cols = st.columns(num_cols)
             
-            for i, (idx, share_img) in enumerate(st.session_state.uploaded_share_data):
+            for i, (idx, share_array) in enumerate(st.session_state.uploaded_share_data):
                 col_idx = i % len(cols)
                 with cols[col_idx]:
-                    st.image(share_img, caption=f"Share {idx}", use_container_width=True)
+                    st.image(share_array, caption=f"Share {idx}", use_container_width=True)
             
             # Check if enough shares are uploaded
             if len(st.session_state.uploaded_share_data) < 2:
@@ -313,9 +431,9 @@ with tab2:
                         
                         try:
                             # Actually combine the shares to recover the original image
-                            combined_image = shares_to_image(
-                                st.session_state.uploaded_share_data,
-                                progress_callback=lambda p: progress_bar.progress(p)
+                            combined_image = cached_shares_to_image(
+                                tuple(st.session_state.uploaded_share_keys),
+                                tuple(st.session_state.uploaded_share_data)
                             )
                             
                             st.session_state.combined_image = combined_image
@@ -337,12 +455,13 @@ with tab2:
                             combined_image.save(img_byte_arr, format='PNG')
                             img_byte_arr = img_byte_arr.getvalue()
                             
-                            download_btn = download_button(
-                                img_byte_arr,
-                                "recovered_image.png",
-                                "Download Original Image (.png)"
+                            st.download_button(
+                                label="Download Original Image (.png)",
+                                data=img_byte_arr,
+                                file_name="recovered_image.png",
+                                mime="image/png",
+                                on_click="ignore"
                             )
-                            st.markdown(download_btn, unsafe_allow_html=True)
                             
                         except Exception as e:
                             st.markdown(f"""
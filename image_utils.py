@@ -1,117 +1,212 @@
 import numpy as np
 from PIL import Image
-import base64
 import io
-from sss_core import split_secret, recover_secret, PRIME
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sss_core import evaluate_polynomial_array, lagrange_basis_at_zero, GF_MUL, FIELD_SIZE
 import time
 
-def create_preview_image(share_data, original_shape):
+# Bytes of one share processed as a tile, small enough that the tiles of all
+# operands and intermediate results of an array expression stay in the CPU cache
+TILE_BYTES = 64 * 1024
+
+def _parallel_map(function, items):
+    """
+    Apply function to every item on a thread pool, yielding the results in order
+    
+    NumPy releases the GIL inside its kernels, so per-share array work runs on
+    several cores. Results are yielded in the calling thread, which is where
+    progress callbacks (Streamlit widgets) have to be called from.
+    """
+    items = list(items)
+    max_workers = max(1, min(len(items), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(function, items)
+
+def create_preview_image(share_data):
     """
     Create a preview image from share data
+    
+    Args:
+        share_data: NumPy array of shape (H, W, 3) with the share values
     """
-    if len(share_data[0]) != 3:  # Check if we have R,G,B channels
+    if share_data.ndim != 3 or share_data.shape[2] != 3:  # Check if we have R,G,B channels
         raise ValueError("Expected share data with 3 channels")
     
-    # Create an empty image with the same shape as the original
-    # Using RGBA where alpha channel stores our marker for 256 values
-    img_array = np.zeros((original_shape[0], original_shape[1], 4), dtype=np.uint8)
+    # GF(2^8) share values always fit in a byte, so they are stored as plain RGB
+    img_array = np.ascontiguousarray(share_data, dtype=np.uint8)
     
-    # Fill the image with share data
-    for y in range(original_shape[0]):
-        for x in range(original_shape[1]):
-            pixel_idx = y * original_shape[1] + x
-            if pixel_idx < len(share_data):
-                r, g, b = share_data[pixel_idx]
-                
-                # Store marker bits in alpha channel (default 255 - fully opaque)
-                # We only need 1 bit per channel to mark if value is 256
-                alpha = 255
-                
-                # Convert values for storage in PNG
-                # If value is 256, store as 0 but mark it in the alpha channel
-                r_mod = r % 256
-                g_mod = g % 256
-                b_mod = b % 256
-                
-                # Mark if any channel had value 256 using specific bits in alpha
-                if r == 256: alpha -= 1  # Subtract 1 for R channel
-                if g == 256: alpha -= 2  # Subtract 2 for G channel
-                if b == 256: alpha -= 4  # Subtract 4 for B channel
+    # Convert numpy array to PIL Image
+    return Image.fromarray(img_array, 'RGB')
+
+def _check_share_parameters(num_shares, threshold):
+    """
+    Validate the (k, t) parameters of a split
+    """
+    if threshold > num_shares:
+        raise ValueError("Threshold cannot be greater than the number of shares")
+    
+    if num_shares >= FIELD_SIZE:
+        raise ValueError(f"Number of shares cannot be greater than {FIELD_SIZE-1}")
+
+def _secret_channels(band_count):
+    """
+    Number of channels split per pixel of an image with band_count bands
+    """
+    # RGB(A) images keep their first 3 channels, grayscale ones (with or
+    # without alpha, e.g. LA) only the first
+    return 3 if band_count >= 3 else 1
+
+def secret_shape(image):
+    """
+    Shape (number of pixels, channels) of the secrets image_to_shares splits for an image
+    """
+    width, height = image.size
+    return (height * width, _secret_channels(len(image.getbands())))
+
+def _random_coefficients(shape):
+    """
+    Draw uniformly random non-zero field elements from os.urandom
+    
+    The shares are only secret if their coefficients are unpredictable, so they come
+    from the OS's cryptographically secure source rather than a NumPy generator.
+    
+    Args:
+        shape: Shape of the array to fill
+        
+    Returns:
+        uint8 NumPy array of the given shape with values in [1, 255]
+    """
+    count = int(np.prod(shape, dtype=int))
+    coefficients = np.empty(count, dtype=np.uint8)
+    
+    filled = 0
+    while filled < count:
+        missing = count - filled
+        # Zero bytes (1 in 256) are rejected, so draw a few more than needed
+        drawn = np.frombuffer(os.urandom(missing + missing // 64 + 16), dtype=np.uint8)
+        drawn = drawn[drawn != 0][:missing]
+        coefficients[filled:filled + len(drawn)] = drawn
+        filled += len(drawn)
+    
+    return coefficients.reshape(shape)
+
+def precompute_share_masks(shape, num_shares, threshold, progress_callback=None, cancel_event=None):
+    """
+    Evaluate the random, secret-independent part of the share polynomials
+    
+    A share is P(x) = a_0 + x * Q(x) where the secret a_0 is the pixel value and
+    Q holds the random coefficients a_1..a_(t-1). The masks x * Q(x) do not depend
+    on the image, so they can be computed before it is known (e.g. while the user
+    is still choosing parameters) and image_to_shares only has to XOR the pixels in.
+    
+    Every set of masks must be used for a single image only: XORing two share
+    sets that were made from the same masks reveals the XOR of the two images.
+    
+    Args:
+        shape: Shape of the secrets, see secret_shape
+        num_shares: Total number of shares to generate
+        threshold: Minimum number of shares needed to reconstruct
+        progress_callback: Function to call with progress updates (0.0-1.0)
+        cancel_event: Optional threading.Event, once it is set the remaining
+            work is skipped and None is returned
+        
+    Returns:
+        uint8 NumPy array of shape (num_shares,) + shape, or None if cancelled
+    """
+    _check_share_parameters(num_shares, threshold)
+    
+    # Random coefficients a_1..a_(t-1) for all pixel polynomials at once
+    coefficients = _random_coefficients((threshold - 1,) + tuple(shape))
+    
+    # Create storage for the masks
+    share_masks = np.zeros((num_shares,) + tuple(shape), dtype=np.uint8)
+    
+    # Evaluate the masks x * Q(x) at x = 1..num_shares, running the whole
+    # Horner chain on one tile of secrets at a time while it is still cached
+    tile_size = max(1, TILE_BYTES // int(np.prod(shape[1:], dtype=int)))
+    
+    def evaluate_share_mask(i):
+        x = i + 1  # Starting from 1, not 0
+        
+        # With t=1 there are no random terms, so the masks stay zero
+        if threshold > 1:
+            for start in range(0, len(share_masks[i]), tile_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
                 
-                img_array[y, x] = [r_mod, g_mod, b_mod, alpha]
+                stop = start + tile_size
+                np.take(GF_MUL[x], evaluate_polynomial_array(coefficients[:, start:stop], x),
+                        out=share_masks[i, start:stop])
     
-    # Convert numpy array to PIL Image with alpha channel
-    return Image.fromarray(img_array, 'RGBA')
+    # The shares are independent, so they are evaluated in parallel
+    for i, _ in enumerate(_parallel_map(evaluate_share_mask, range(num_shares))):
+        # Update progress once per share, the last share reports 1.0
+        if progress_callback:
+            progress_callback((i + 1) / num_shares)
+    
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    return share_masks
 
-def image_to_shares(image, num_shares, threshold, progress_callback=None):
+def image_to_shares(image, num_shares, threshold, progress_callback=None, share_masks=None):
     """
     Convert an image to Shamir's Secret Sharing shares
     
+    Every pixel channel still gets its own random polynomial, but all of them
+    are evaluated together on NumPy arrays instead of one split_secret call per pixel.
+    
     Args:
         image: PIL Image object
         num_shares: Total number of shares to generate
         threshold: Minimum number of shares needed to reconstruct
         progress_callback: Function to call with progress updates (0.0-1.0)
+        share_masks: Optional unused masks from precompute_share_masks for this
+            image shape and parameters, computed here when not given
         
     Returns:
         tuple: (shares_data, share_preview_images)
-            - shares_data: List of lists, each containing the y values for all pixels in the image
+            - shares_data: uint8 NumPy array of shape (num_shares, H, W, 3) with the y values of all pixels
             - share_preview_images: List of PIL Image objects for preview
     """
-    # Convert image to numpy array for processing
-    img_array = np.array(image)
+    _check_share_parameters(num_shares, threshold)
+    
+    # Convert image to numpy array for processing, decoding it in one pass first
+    # (the array is only read, so it can share the image's buffer)
+    image.load()
+    img_array = np.asarray(image)
     height, width = img_array.shape[:2]
     
+    # Get pixel values as one secret per row, in the shape secret_shape reports
+    bands = img_array.reshape(height, width, -1)
+    channels = _secret_channels(bands.shape[2])
+    pixels = bands[..., :channels].reshape(-1, channels)
+    
+    # Every secret has to be a field element, values of 16-bit or float images
+    # outside [0, 255] would otherwise silently wrap around in the conversion
+    secrets = pixels.astype(np.uint8, copy=False)
+    if pixels.dtype != np.uint8 and not np.array_equal(secrets, pixels):
+        raise ValueError(f"Pixel values must be whole numbers in range [0, {FIELD_SIZE-1}], convert the {image.mode} image to 8 bits per channel first")
+    
+    if share_masks is None:
+        share_masks = precompute_share_masks(secrets.shape, num_shares, threshold, progress_callback)
+    elif share_masks.shape != (num_shares,) + secrets.shape:
+        raise ValueError("Precomputed share masks do not match the image and share parameters")
+    
     # Create storage for shares
-    shares_data = [[] for _ in range(num_shares)]
-    
-    # Total number of pixels for progress tracking
-    total_pixels = height * width
-    processed_pixels = 0
-    
-    # Process each pixel
-    for y in range(height):
-        for x in range(width):
-            # Get pixel values
-            if len(img_array.shape) == 3 and img_array.shape[2] >= 3:  # RGB or RGBA image
-                r, g, b = img_array[y, x][:3]  # Get first 3 channels (RGB)
-                
-                # Split each color channel
-                r_shares = split_secret(int(r), threshold, num_shares)
-                g_shares = split_secret(int(g), threshold, num_shares)
-                b_shares = split_secret(int(b), threshold, num_shares)
-                
-                # Store the y values in the corresponding share
-                for i in range(num_shares):
-                    shares_data[i].append((r_shares[i][1], g_shares[i][1], b_shares[i][1]))
-            
-            else:  # Grayscale image
-                pixel = img_array[y, x]
-                
-                # Split the grayscale value
-                pixel_shares = split_secret(int(pixel), threshold, num_shares)
-                
-                # Store the y values
-                for i in range(num_shares):
-                    # Duplicate the value to create RGB
-                    value = pixel_shares[i][1]
-                    shares_data[i].append((value, value, value))
-            
-            # Update progress
-            processed_pixels += 1
-            if progress_callback and processed_pixels % 500 == 0:  # Reduced frequency of updates
-                progress_callback(processed_pixels / total_pixels)
+    shares_data = np.empty((num_shares, height, width, 3), dtype=np.uint8)
+    
+    # Adding the secret a_0 to the masks is a single XOR per share;
+    # grayscale shares duplicate the value to create RGB
+    for i in range(num_shares):
+        shares_data[i] = (share_masks[i] ^ secrets).reshape(height, width, -1)
     
     # Create preview images for each share
     share_preview_images = []
     for share_data in shares_data:
-        share_img = create_preview_image(share_data, (height, width, 3))
+        share_img = create_preview_image(share_data)
         share_preview_images.append(share_img)
     
-    # Final progress update
-    if progress_callback:
-        progress_callback(1.0)
-    
     return shares_data, share_preview_images
 
 def shares_to_image(shares, progress_callback=None):
@@ -119,7 +214,7 @@ def shares_to_image(shares, progress_callback=None):
     Reconstruct an image from its shares
     
     Args:
-        shares: List of tuples (index, PIL Image)
+        shares: List of tuples (index, share) where share is a PIL Image or a NumPy array of its pixels
         progress_callback: Function to call with progress updates (0.0-1.0)
         
     Returns:
@@ -128,147 +223,65 @@ def shares_to_image(shares, progress_callback=None):
     if not shares:
         raise ValueError("No shares provided")
     
-    # Get dimensions from the first share
-    _, first_share = shares[0]
-    width, height = first_share.size
+    # Validate the shares once up front, so that the recovery itself cannot fail
+    indices = [idx for idx, _ in shares]
+    for idx in indices:
+        if not 0 < idx < FIELD_SIZE:
+            raise ValueError(f"Share index {idx} is out of range [1, {FIELD_SIZE-1}]")
+    
+    if len(set(indices)) != len(indices):
+        raise ValueError("Every share can only be used once, found duplicate share indices")
     
-    # Extract share data from images
-    share_data = []
+    # Extract share data from images as (H, W, 3) arrays
+    share_arrays = []
     for idx, share_img in shares:
-        # Convert image to numpy array
-        img_array = np.array(share_img)
+        # Convert image to numpy array without an extra copy
+        if isinstance(share_img, Image.Image):
+            share_img.load()
+        img_array = np.asarray(share_img)
         
-        # Extract pixel data
-        pixels = []
-        for y in range(height):
-            for x in range(width):
-                if len(img_array.shape) >= 3:  # RGB or RGBA image
-                    r, g, b = img_array[y, x][:3]  # Get RGB values
-                    
-                    # Check if this image has an alpha channel (our marker channel)
-                    if img_array.shape[2] == 4:
-                        alpha = img_array[y, x, 3]
-                        
-                        # Check bits in alpha to detect 256 values
-                        # Alpha values below 255 indicate 256 values in specific channels
-                        if alpha < 255:
-                            # Check if R channel had 256 (bit 0 is set)
-                            if (255 - alpha) & 1:
-                                r = 256 if r == 0 else r
-                            
-                            # Check if G channel had 256 (bit 1 is set)
-                            if (255 - alpha) & 2:
-                                g = 256 if g == 0 else g
-                                
-                            # Check if B channel had 256 (bit 2 is set)
-                            if (255 - alpha) & 4:
-                                b = 256 if b == 0 else b
-                    
-                    pixels.append((r, g, b))
-                else:  # Grayscale image
-                    value = img_array[y, x]
-                    pixels.append((value, value, value))
+        if len(img_array.shape) >= 3:  # RGB or RGBA image
+            # Shares are plain RGB; an alpha channel carrying 256-markers
+            # means the share was made by the older GF(257) version
+            if img_array.shape[2] == 4 and (img_array[..., 3] < 255).any():
+                raise ValueError(f"Share {idx} uses the old GF(257) alpha-marker format and cannot be combined")
+            
+            pixels = img_array[..., :3]  # Get RGB values
+        else:  # Grayscale image
+            pixels = np.repeat(img_array[..., np.newaxis], 3, axis=2)
         
-        share_data.append((idx, pixels))
-    
-    # Create reconstructed image array
-    reconstructed = np.zeros((height, width, 3), dtype=np.uint8)
+        share_arrays.append(pixels)
     
-    # Total number of pixels for progress tracking
-    total_pixels = height * width
-    processed_pixels = 0
+    if any(pixels.shape != share_arrays[0].shape for pixels in share_arrays):
+        raise ValueError("All shares must have the same image size")
     
-    # Process each pixel position
-    for y in range(height):
-        for x in range(width):
-            pixel_idx = y * width + x
-            
-            # Gather shares for this pixel
-            r_shares = []
-            g_shares = []
-            b_shares = []
-            
-            for idx, pixels in share_data:
-                if pixel_idx < len(pixels):
-                    r, g, b = pixels[pixel_idx]
-                    r_shares.append((idx, r))
-                    g_shares.append((idx, g))
-                    b_shares.append((idx, b))
-            
-            # Recover the original RGB values
-            try:
-                r = recover_secret(r_shares)
-                g = recover_secret(g_shares)
-                b = recover_secret(b_shares)
-                
-                # Ensure values are within 0-255 range for final image
-                r = min(255, r % 256)
-                g = min(255, g % 256)
-                b = min(255, b % 256)
-                
-                reconstructed[y, x] = [r, g, b]
-            except Exception as e:
-                # If recovery fails, set to black
-                reconstructed[y, x] = [0, 0, 0]
-            
-            # Update progress
-            processed_pixels += 1
-            if progress_callback and processed_pixels % 500 == 0:  # Reduced frequency of updates
-                progress_callback(processed_pixels / total_pixels)
+    share_stack = np.stack(share_arrays).astype(np.uint8, copy=False)  # Shape (num_shares, H, W, 3)
     
-    # Final progress update
-    if progress_callback:
-        progress_callback(1.0)
+    # The share x values are the same for every pixel, so the Lagrange basis
+    # polynomials evaluated at x=0 only need to be computed once
+    weights = lagrange_basis_at_zero(indices)
     
-    # Convert numpy array to PIL Image
-    return Image.fromarray(reconstructed)
-
-def download_button(object_to_download, download_filename, button_text):
-    """
-    Generate a link to download the given object.
+    # Recover the original RGB values by adding up (XOR) the weighted shares,
+    # a few rows at a time so that a tile is finished while it is still cached
+    height, width = share_stack.shape[1:3]
+    tile_rows = max(1, TILE_BYTES // (width * 3))
+    tile_starts = range(0, height, tile_rows)
+    reconstructed = np.empty(share_stack.shape[1:], dtype=np.uint8)
     
-    Args:
-        object_to_download: The object to be downloaded (file or bytes)
-        download_filename: Filename to download as
-        button_text: Text to display on the download button
-        
-    Returns:
-        HTML string containing the download link
-    """
-    try:
-        # If object is a file or bytes-like object
-        b64 = base64.b64encode(object_to_download).decode()
-    except AttributeError:
-        # If object is a string
-        b64 = base64.b64encode(object_to_download.encode()).decode()
-    
-    button_uuid = str(id(button_text))
-    button_id = f"download-button-{button_uuid}"
-    
-    custom_css = f"""
-        <style>
-            #{button_id} {{
-                background-color: #d90429;
-                color: white;
-                padding: 0.5rem 1rem;
-                border-radius: 5px;
-                border: none;
-                text-decoration: none;
-                font-size: 0.9rem;
-                text-align: center;
-                display: inline-block;
-                margin: 0.25rem 0;
-                cursor: pointer;
-                transition: background-color 0.3s;
-            }}
-            #{button_id}:hover {{
-                background-color: #ef233c;
-            }}
-        </style>
-    """
+    def recover_tile(start):
+        tile = reconstructed[start:start + tile_rows]
+        weighted_share = np.empty_like(tile)
+        np.take(GF_MUL[weights[0]], share_stack[0, start:start + tile_rows], out=tile)
+        for i in range(1, len(weights)):
+            np.take(GF_MUL[weights[i]], share_stack[i, start:start + tile_rows], out=weighted_share)
+            tile ^= weighted_share
     
-    download_link = custom_css + f"""
-        <a id="{button_id}" href="data:application/octet-stream;base64,{b64}" download="{download_filename}">{button_text}</a>
-    """
+    # The tiles do not overlap, so they are recovered in parallel
+    for i, _ in enumerate(_parallel_map(recover_tile, tile_starts)):
+        # Update progress whenever another percent of the tiles is done,
+        # the last tile reports 1.0
+        if progress_callback and (100 * (i + 1)) // len(tile_starts) != (100 * i) // len(tile_starts):
+            progress_callback((i + 1) / len(tile_starts))
     
-    return download_link
+    # Convert numpy array to PIL Image
+    return Image.fromarray(reconstructed)
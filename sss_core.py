@@ -1,38 +1,97 @@
 import random
+from functools import lru_cache
 import numpy as np
 
-# Define the prime number for the finite field
-# Using 257 as it's the smallest prime greater than 255 (max pixel value)
-PRIME = 257
+# Shares are computed in the finite field GF(2^8) so that every value fits in a byte
+# (a pixel value). Addition and subtraction are XOR, multiplication and inversion are table lookups.
+FIELD_SIZE = 256
 
-def mod_inverse(num, mod):
+# Irreducible polynomial x^8 + x^4 + x^3 + x^2 + 1 used to reduce products
+FIELD_POLYNOMIAL = 0x11d
+
+def _build_log_exp_tables():
+    """
+    Build the logarithm and antilogarithm tables of GF(2^8) for the generator 2
+    """
+    exp_table = np.zeros(2 * FIELD_SIZE, dtype=np.uint8)
+    log_table = np.zeros(FIELD_SIZE, dtype=np.int16)
+    
+    value = 1
+    for power in range(FIELD_SIZE - 1):
+        exp_table[power] = value
+        log_table[value] = power
+        value <<= 1
+        if value & FIELD_SIZE:
+            value ^= FIELD_POLYNOMIAL
+    
+    # Repeat the exp table so that GF_EXP[log(a) + log(b)] never needs a modulo
+    exp_table[FIELD_SIZE - 1:] = exp_table[:FIELD_SIZE + 1]
+    return exp_table, log_table
+
+GF_EXP, GF_LOG = _build_log_exp_tables()
+
+def _build_mul_inv_tables():
     """
-    Calculate the modular multiplicative inverse using Extended Euclidean Algorithm
+    Build the full 256x256 multiplication table and the inverse table of GF(2^8)
     """
-    # Extended Euclidean Algorithm to find modular multiplicative inverse
-    def extended_gcd(a, b):
-        if a == 0:
-            return (b, 0, 1)
-        else:
-            g, x, y = extended_gcd(b % a, a)
-            return (g, y - (b // a) * x, x)
+    logs = GF_LOG[np.arange(FIELD_SIZE)]
+    mul_table = GF_EXP[logs[:, np.newaxis] + logs[np.newaxis, :]]
+    mul_table[0, :] = 0
+    mul_table[:, 0] = 0
     
-    gcd, x, y = extended_gcd(num, mod)
-    if gcd != 1:
-        raise ValueError(f"Modular inverse does not exist for {num} mod {mod}")
-    else:
-        return (x % mod + mod) % mod
+    # 0 has no inverse, its entry is left as 0
+    inv_table = np.zeros(FIELD_SIZE, dtype=np.uint8)
+    inv_table[1:] = GF_EXP[FIELD_SIZE - 1 - logs[1:]]
+    return mul_table, inv_table
+
+# 64KB multiplication table, so a product over whole arrays is a single gather
+GF_MUL, GF_INV = _build_mul_inv_tables()
+
+def gf_mul(a, b):
+    """
+    Multiply two elements of GF(2^8)
+    """
+    return int(GF_MUL[a, b])
 
-def evaluate_polynomial(coefficients, x, prime):
+def gf_inv(num):
     """
-    Evaluate a polynomial with given coefficients at point x in a finite field with given prime.
+    Calculate the multiplicative inverse of an element of GF(2^8)
+    """
+    if num == 0:
+        raise ValueError("Multiplicative inverse does not exist for 0 in GF(2^8)")
+    return int(GF_INV[num])
+
+def evaluate_polynomial(coefficients, x):
+    """
+    Evaluate a polynomial with given coefficients at point x in GF(2^8).
     """
     result = 0
     for coefficient in reversed(coefficients):
-        result = (result * x + coefficient) % prime
+        result = gf_mul(result, x) ^ coefficient
     return result
 
-def split_secret(secret, threshold, num_shares, prime=PRIME):
+def evaluate_polynomial_array(coefficients, x):
+    """
+    Evaluate many polynomials at point x in GF(2^8) at once, element-wise.
+    
+    Args:
+        coefficients: Non-empty sequence (or array) of equally shaped uint8 arrays,
+            lowest degree first, holding the coefficients of every polynomial
+        x: Point to evaluate at
+        
+    Returns:
+        uint8 array with the value of every polynomial (for a constant polynomial
+        this is the coefficient array itself)
+    """
+    # Multiplying by a fixed x only needs one 256-entry row of the table,
+    # so each degree costs a single gather and XOR over the whole array (Horner's method)
+    mul_by_x = GF_MUL[x]
+    result = coefficients[-1]  # A single coefficient (e.g. Q(x) = a_1 for t=2) needs no step
+    for coefficient in coefficients[-2::-1]:
+        result = np.take(mul_by_x, result) ^ coefficient
+    return result
+
+def split_secret(secret, threshold, num_shares):
     """
     Split a secret into n shares using Shamir's Secret Sharing.
     
@@ -40,7 +99,6 @@ def split_secret(secret, threshold, num_shares, prime=PRIME):
         secret: The secret to share (0-255 for pixel values)
         threshold: Minimum number of shares required to reconstruct the secret
         num_shares: Total number of shares to generate
-        prime: Prime number for the finite field
         
     Returns:
         List of tuples (x_i, y_i) where each tuple is a share
@@ -48,30 +106,67 @@ def split_secret(secret, threshold, num_shares, prime=PRIME):
     if threshold > num_shares:
         raise ValueError("Threshold cannot be greater than the number of shares")
     
-    if not 0 <= secret < prime:
-        raise ValueError(f"Secret must be in range [0, {prime-1}]")
+    if num_shares >= FIELD_SIZE:
+        raise ValueError(f"Number of shares cannot be greater than {FIELD_SIZE-1}")
+    
+    if not 0 <= secret < FIELD_SIZE:
+        raise ValueError(f"Secret must be in range [0, {FIELD_SIZE-1}]")
     
     # Generate random coefficients for the polynomial
     coefficients = [secret]  # First coefficient is the secret
     for _ in range(threshold - 1):
-        coefficients.append(random.randint(1, prime - 1))
+        coefficients.append(random.randint(1, FIELD_SIZE - 1))
     
     # Generate shares
     shares = []
     for i in range(1, num_shares + 1):  # Starting from 1, not 0
         x = i
-        y = evaluate_polynomial(coefficients, x, prime)
+        y = evaluate_polynomial(coefficients, x)
         shares.append((x, y))
     
     return shares
 
-def lagrange_interpolation(shares, prime=PRIME):
+@lru_cache(maxsize=128)
+def _lagrange_basis_at_zero(x_values):
+    """
+    Cached implementation of lagrange_basis_at_zero for a tuple of x values
+    """
+    basis = []
+    for i, x_i in enumerate(x_values):
+        numerator = 1
+        denominator = 1
+        
+        for j, x_j in enumerate(x_values):
+            if i != j:
+                # Subtraction is XOR in GF(2^8), so (0 - x_j) is just x_j
+                numerator = gf_mul(numerator, x_j)
+                denominator = gf_mul(denominator, x_i ^ x_j)
+        
+        basis.append(gf_mul(numerator, gf_inv(denominator)))
+    return tuple(basis)
+
+def lagrange_basis_at_zero(x_values):
+    """
+    Calculate the Lagrange basis polynomials of the given x values evaluated at x=0.
+    
+    The basis only depends on the x values of the shares, so it is cached and
+    reused for every secret (pixel and channel) recovered from the same shares.
+    
+    Args:
+        x_values: Sequence of share x values
+        
+    Returns:
+        uint8 NumPy array with one weight per x value
+    """
+    # The cache holds immutable tuples, every caller gets its own array
+    return np.array(_lagrange_basis_at_zero(tuple(int(x) for x in x_values)), dtype=np.uint8)
+
+def lagrange_interpolation(shares):
     """
     Reconstruct the secret (y-intercept) using Lagrange interpolation.
     
     Args:
         shares: List of tuples (x_i, y_i) representing the shares
-        prime: Prime number for the finite field
         
     Returns:
         The reconstructed secret
@@ -80,39 +175,26 @@ def lagrange_interpolation(shares, prime=PRIME):
         raise ValueError("No shares provided")
     
     # Evaluate at x=0 (the secret is the y-intercept)
-    x_values = [x for x, _ in shares]
-    y_values = [y for _, y in shares]
+    basis = lagrange_basis_at_zero([x for x, _ in shares])
     
     secret = 0
-    for i, (x_i, y_i) in enumerate(shares):
-        numerator = 1
-        denominator = 1
-        
-        for j, x_j in enumerate([x for x, _ in shares]):
-            if i != j:
-                numerator = (numerator * (0 - x_j)) % prime
-                denominator = (denominator * (x_i - x_j)) % prime
-        
-        # Calculate the Lagrange basis polynomial evaluated at x=0
-        lagrange_basis = (numerator * mod_inverse(denominator, prime)) % prime
-        
+    for (_, y_i), lagrange_basis in zip(shares, basis):
         # Add this term's contribution to the result
-        secret = (secret + y_i * lagrange_basis) % prime
+        secret ^= gf_mul(y_i, lagrange_basis)
     
     return secret
 
-def recover_secret(shares, prime=PRIME):
+def recover_secret(shares):
     """
     Recover the secret from at least threshold shares.
     
     Args:
         shares: List of tuples (x_i, y_i) representing the shares
-        prime: Prime number for the finite field
         
     Returns:
         The recovered secret
     """
-    return lagrange_interpolation(shares, prime)
+    return lagrange_interpolation(shares)
 
 # Testing the implementation
 if __name__ == "__main__":
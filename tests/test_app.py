@@ -0,0 +1,140 @@
+"""
+End-to-end checks of the Streamlit app with Streamlit's AppTest
+"""
+import io
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+def _app_with_uploads(app_path):
+    """
+    Run the app with st.file_uploader returning the files stored in the session state
+    
+    AppTest cannot drive file uploaders, so the test puts the image bytes in
+    'test_image_file' and a list of (name, bytes) shares in 'test_share_files'.
+    """
+    import io
+    import os
+    import runpy
+    import sys
+    import streamlit as st
+    
+    class Upload(io.BytesIO):
+        def __init__(self, name, data):
+            super().__init__(data)
+            self.name = name
+    
+    def file_uploader(label, type=None, accept_multiple_files=False, **kwargs):
+        if accept_multiple_files:
+            files = st.session_state.get("test_share_files")
+            return [Upload(name, data) for name, data in files] if files else None
+        data = st.session_state.get("test_image_file")
+        return Upload("image.png", data) if data is not None else None
+    
+    sys.path.insert(0, os.path.dirname(app_path))
+    original_file_uploader = st.file_uploader
+    st.file_uploader = file_uploader
+    try:
+        runpy.run_path(app_path, run_name="__main__")
+    finally:
+        st.file_uploader = original_file_uploader
+
+def _png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _errors(at):
+    return [m.value for m in at.markdown if 'class="error-box"' in m.value]
+
+def _click(at, label):
+    button = next(b for b in at.button if label in b.label)
+    button.click().run()
+    assert not at.exception, at.exception
+    assert not _errors(at), _errors(at)
+
+def _start_app():
+    return AppTest.from_function(_app_with_uploads, args=(str(APP_PATH),), default_timeout=60)
+
+def _start_split(secret):
+    at = _start_app()
+    at.session_state.test_image_file = _png_bytes(Image.fromarray(secret))
+    at.run()
+    assert not at.exception, at.exception
+    return at
+
+def test_encrypt_twice():
+    secret = np.random.default_rng(0).integers(0, 256, (24, 31, 3), dtype=np.uint8)
+    at = _start_split(secret)
+    
+    # The second click with the same inputs is served from the cache
+    for _ in range(2):
+        _click(at, "Encrypt")
+        assert at.session_state.shares.shape == (3, 24, 31, 3)
+
+def test_encrypt_twice_without_precomputed_masks():
+    secret = np.random.default_rng(1).integers(0, 256, (24, 31, 3), dtype=np.uint8)
+    at = _start_split(secret)
+    
+    mask_key = at.session_state.share_mask_job['key']
+    for _ in range(2):
+        # Let the background job end without masks, so image_to_shares computes them itself
+        finished = threading.Thread(target=lambda: None)
+        finished.start()
+        finished.join()
+        at.session_state.share_mask_job = {
+            'key': mask_key, 'masks': None, 'cancel': threading.Event(), 'thread': finished
+        }
+        
+        _click(at, "Encrypt")
+        assert at.session_state.shares.shape == (3, 24, 31, 3)
+
+def test_combine_twice():
+    secret = np.random.default_rng(2).integers(0, 256, (24, 31, 3), dtype=np.uint8)
+    at = _start_split(secret)
+    _click(at, "Encrypt")
+    shares = at.session_state.shares
+    
+    # Combine 2 of the 3 shares, under the file names the app offers for download
+    at = _start_app()
+    at.session_state.test_share_files = [
+        (f"share_{i+1}.png", _png_bytes(Image.fromarray(shares[i]))) for i in (0, 2)
+    ]
+    at.run()
+    assert not at.exception, at.exception
+    
+    # The second click with the same shares is served from the cache
+    for _ in range(2):
+        _click(at, "Combine")
+        assert (np.asarray(at.session_state.combined_image) == secret).all()
+
+def test_mask_job_only_for_pending_small_images():
+    secret = np.random.default_rng(3).integers(0, 256, (24, 31, 3), dtype=np.uint8)
+    at = _start_split(secret)
+    job = at.session_state.share_mask_job
+    assert job is not None
+    
+    # Encrypted inputs are cached, so they do not get a new job
+    _click(at, "Encrypt")
+    at.run()
+    assert at.session_state.share_mask_job is None
+    
+    # A new image does, and removing it stops and drops that job
+    at.session_state.test_image_file = _png_bytes(Image.fromarray(secret[::-1]))
+    at.run()
+    job = at.session_state.share_mask_job
+    assert job is not None
+    at.session_state.test_image_file = None
+    at.run()
+    assert job['cancel'].is_set()
+    assert at.session_state.share_mask_job is None
+
+def test_no_mask_job_for_large_images():
+    secret = np.zeros((710, 710, 3), dtype=np.uint8)
+    at = _start_split(secret)
+    assert at.session_state.share_mask_job is None